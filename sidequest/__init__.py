@@ -1,10 +1,11 @@
 """SideQuest task management library."""
 
-from .quests import quest, QUEST_REGISTRY, QuestContext
+from .quests import quest, QUEST_REGISTRY, QuestArguments, QuestContext
 from .dispatch import dispatch
 from .worker import Worker, BaseWorker
 from .queue import InMemoryQueue
-from .db import ResultDB
+from .db import BaseResultDB, ResultDB, ShardedResultDB
+from .cache import ResultCache
 from .workflow import Workflow
 from .messages import QuestMessage
 
@@ -15,8 +16,12 @@ __all__ = [
     "BaseWorker",
     "InMemoryQueue",
     "QuestContext",
+    "QuestArguments",
     "Workflow",
+    "BaseResultDB",
     "ResultDB",
+    "ShardedResultDB",
+    "ResultCache",
     "QUEST_REGISTRY",
     "QuestMessage",
 ]
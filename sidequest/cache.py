@@ -0,0 +1,49 @@
+"""Bounded in-memory handoff of recent quest results."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any
+
+
+class ResultCache:
+    """Least-recently-used store of live quest results keyed by context id.
+
+    Workers place successful results here so that dependent quests executed in
+    the same process can use the Python object directly instead of reading it
+    back from the :class:`~sidequest.db.ResultDB`. Workers sharing a cache also
+    share each other's results. Cached values are handed out as-is, so quests
+    should not mutate their inputs.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+
+    def put(self, context_id: str, value: Any) -> None:
+        """Store ``value`` for ``context_id``, evicting the oldest entry if full."""
+        self._entries[context_id] = value
+        self._entries.move_to_end(context_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, context_id: str) -> None:
+        """Remove the entry for ``context_id`` if present."""
+        self._entries.pop(context_id, None)
+
+    def __getitem__(self, context_id: str) -> Any:
+        value = self._entries[context_id]
+        self._entries.move_to_end(context_id)
+        return value
+
+    def __contains__(self, context_id: object) -> bool:
+        return context_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared by all workers of the process that are not given a cache explicitly.
+DEFAULT_CACHE = ResultCache()
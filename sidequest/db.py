@@ -1,10 +1,25 @@
 """Simple SQLite-based result storage."""
 
-from typing import Optional, Any, List
+from typing import (
+    Optional,
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+    Set,
+    cast,
+)
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from datetime import datetime
+import asyncio
 import json
+import zlib
 
-from sqlalchemy import String, select, update
+from sqlalchemy import CursorResult, String, select, update
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -12,11 +27,38 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.pool import StaticPool
 
 from .quests import QUEST_REGISTRY
 
 from pydantic import TypeAdapter
 
+# Tasks in these states must not be executed.
+SKIPPED_STATUSES = ("UPSTREAM_FAILED", "CANCELLED")
+FINISHED_STATUSES = ("SUCCESS", "FAILED", *SKIPPED_STATUSES)
+
+
+@dataclass(frozen=True)
+class SerializedResult:
+    """Quest result that has already been serialized to JSON."""
+
+    json: str
+
+
+def serialize_result(result: Any) -> Optional[SerializedResult]:
+    """Serialize ``result`` for storage, raising if it cannot be persisted."""
+    if result is None:
+        return None
+    return SerializedResult(TypeAdapter(Any).dump_json(result).decode())
+
+
+def _dump_result(result: Any) -> Optional[str]:
+    if result is None:
+        return None
+    if isinstance(result, SerializedResult):
+        return result.json
+    return TypeAdapter(Any).dump_json(result).decode()
+
 
 class Base(DeclarativeBase):
     """Declarative base class."""
@@ -34,12 +76,218 @@ class Result(Base):
     quest_name: Mapped[str] = mapped_column(String)
     status: Mapped[str] = mapped_column(String)
     deps: Mapped[str] = mapped_column(String)
+    workflow_id: Mapped[Optional[str]] = mapped_column(
+        String, nullable=True, index=True
+    )
     result: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     timestamp: Mapped[str] = mapped_column(String)
 
 
-class ResultDB:
+class StreamChunk(Base):
+    """ORM model representing a chunk yielded by a streaming quest."""
+
+    __tablename__ = "stream_chunks"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    context_id: Mapped[str] = mapped_column(String, index=True)
+    seq: Mapped[int] = mapped_column()
+    value: Mapped[str] = mapped_column(String)
+
+
+class BaseResultDB(ABC):
+    """Interface of the stores that keep quest statuses and results."""
+
+    @abstractmethod
+    async def setup(self) -> None:
+        """Create the storage tables."""
+
+    @abstractmethod
+    async def teardown(self) -> None:
+        """Drop the storage tables and release connections."""
+
+    @abstractmethod
+    async def register_task(
+        self,
+        context_id: str,
+        quest_name: str,
+        deps: List[str],
+        workflow_id: Optional[str] = None,
+    ) -> None:
+        """Insert a new task with ``PENDING`` status.
+
+        Failures only propagate to tasks registered with the same
+        ``workflow_id``.
+        """
+
+    @abstractmethod
+    async def mark_running(self, context_id: str) -> bool:
+        """Mark the given task as currently running.
+
+        Returns ``False`` if the task was cancelled or one of its upstream quests
+        failed, in which case it must not be executed.
+        """
+
+    @abstractmethod
+    async def mark_running_many(self, context_ids: Sequence[str]) -> Set[str]:
+        """Mark all given tasks as currently running.
+
+        Returns the ids of the tasks that must be skipped, see
+        :meth:`mark_running`.
+        """
+
+    @abstractmethod
+    async def fetch_status(self, context_id: str) -> Optional[str]:
+        """Return the status for the given task id."""
+
+    @abstractmethod
+    async def fetch_statuses(self, context_ids: Sequence[str]) -> Dict[str, str]:
+        """Return the statuses of the given tasks keyed by id."""
+
+    @abstractmethod
+    async def fetch_record(
+        self, context_id: str
+    ) -> Optional[tuple[str, str, Optional[str], List[str]]]:
+        """Fetch the task entry for the given id."""
+
+    @abstractmethod
+    async def fetch_records(
+        self, context_ids: Sequence[str]
+    ) -> Dict[str, tuple[str, str, Optional[str], List[str]]]:
+        """Fetch the task entries for the given ids keyed by id."""
+
+    @abstractmethod
+    async def store_many(
+        self,
+        entries: Sequence[tuple[str, str, Optional[Any], Optional[str], str]],
+    ) -> None:
+        """Store ``(context_id, quest_name, result, error, status)`` entries in
+        a single transaction.
+
+        Results may be passed pre-serialized as :class:`SerializedResult`.
+        Cancelled or skipped tasks keep their status.
+        """
+
+    @abstractmethod
+    async def fetch_all(self) -> list[tuple]:
+        """Return ``(context_id, quest_name, result, error, timestamp)`` rows."""
+
+    @abstractmethod
+    async def fetch_result(self, context_id: str) -> Optional[Any]:
+        """Return the deserialized result of the given task."""
+
+    @abstractmethod
+    async def append_chunk(self, context_id: str, seq: int, value: Any) -> None:
+        """Persist the ``seq``-th chunk yielded by a streaming quest."""
+
+    @abstractmethod
+    async def fetch_chunks(self, context_id: str, start: int = 0) -> List[Any]:
+        """Return the chunks of a streaming quest from position ``start`` on."""
+
+    @abstractmethod
+    async def exists(self, context_id: str) -> bool:
+        """Return ``True`` if a result entry with the given context id exists."""
+
+    @abstractmethod
+    async def _fetch_graph(self, context_ids: Sequence[str]) -> Dict[str, List[str]]:
+        """Return the dependencies of every task in the workflows of the given
+        tasks keyed by id."""
+
+    @abstractmethod
+    async def _set_statuses(
+        self,
+        context_ids: Set[str],
+        status: str,
+        error: str,
+        current: Sequence[str] = ("PENDING",),
+    ) -> None:
+        """Set the status of the given tasks whose status is in ``current``."""
+
+    async def store(
+        self,
+        context_id: str,
+        quest_name: str,
+        result: Optional[Any],
+        error: Optional[str],
+        status: str,
+    ) -> None:
+        await self.store_many([(context_id, quest_name, result, error, status)])
+
+    async def stream(
+        self, context_id: str, poll_interval: float = 0.01
+    ) -> AsyncIterator[Any]:
+        """Yield the chunks of a streaming quest as they are produced.
+
+        Raises ``RuntimeError`` once the available chunks are exhausted if the
+        producing quest failed.
+        """
+        seq = 0
+        while True:
+            status = await self.fetch_status(context_id)
+            chunks = await self.fetch_chunks(context_id, seq)
+            for chunk in chunks:
+                yield chunk
+            seq += len(chunks)
+            if chunks:
+                continue
+            if status == "SUCCESS":
+                return
+            if status in ("FAILED", *SKIPPED_STATUSES):
+                raise RuntimeError(f"Streaming quest {context_id} failed")
+            await asyncio.sleep(poll_interval)
+
+    async def mark_upstream_failed(
+        self,
+        context_ids: Sequence[str],
+        cancel_siblings: bool = False,
+        overwrite: bool = False,
+    ) -> None:
+        """Mark all registered descendants of the failed tasks ``UPSTREAM_FAILED``.
+
+        Only the workflows of the failed tasks are walked and only pending
+        descendants are marked, unless ``overwrite`` is set. Then descendants
+        that already started or succeeded are marked too, e.g. because they
+        consumed a result that could not be persisted. With
+        ``cancel_siblings``, pending tasks that only contribute to the same
+        failed outcomes are marked ``CANCELLED`` as well.
+        """
+        if not context_ids:
+            return
+        graph = await self._fetch_graph(context_ids)
+        consumers: Dict[str, List[str]] = {}
+        for task_id, deps in graph.items():
+            for dep in deps:
+                consumers.setdefault(dep, []).append(task_id)
+        if len(context_ids) == 1:
+            culprit = f"quest {context_ids[0]}"
+        else:
+            culprit = f"{len(context_ids)} quests"
+        descendants = _closure(context_ids, consumers)
+        current = ("PENDING", "RUNNING", "STREAMING", "SUCCESS")
+        await self._set_statuses(
+            descendants,
+            "UPSTREAM_FAILED",
+            f"Upstream {culprit} failed",
+            current if overwrite else ("PENDING",),
+        )
+        if not cancel_siblings:
+            return
+        failed = descendants | set(context_ids)
+        outcomes = [task_id for task_id in failed if task_id not in consumers]
+        siblings = _closure(outcomes, graph) - failed
+        await self._set_statuses(
+            siblings, "CANCELLED", f"Cancelled after {culprit} failed"
+        )
+
+    async def cancel(self, context_ids: Iterable[str]) -> None:
+        """Mark the given pending tasks ``CANCELLED``.
+
+        Tasks that are already running are not interrupted and finish normally.
+        """
+        await self._set_statuses(set(context_ids), "CANCELLED", "Cancelled")
+
+
+class ResultDB(BaseResultDB):
     """Asynchronous database using SQLAlchemy."""
 
     def __init__(self, url: str = "sqlite+aiosqlite:///:memory:") -> None:
@@ -47,6 +295,21 @@ class ResultDB:
         self.session_factory = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        # In-memory databases share a single connection between all sessions,
+        # so concurrent sessions would see and roll back each other's writes.
+        self._lock = (
+            asyncio.Lock() if isinstance(self.engine.pool, StaticPool) else None
+        )
+
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        if self._lock is None:
+            async with self.session_factory() as session:
+                yield session
+            return
+        async with self._lock:
+            async with self.session_factory() as session:
+                yield session
 
     async def setup(self) -> None:
         await self._init_tables()
@@ -56,16 +319,20 @@ class ResultDB:
             await conn.run_sync(Base.metadata.create_all)
 
     async def register_task(
-        self, context_id: str, quest_name: str, deps: List[str]
+        self,
+        context_id: str,
+        quest_name: str,
+        deps: List[str],
+        workflow_id: Optional[str] = None,
     ) -> None:
-        """Insert a new task with ``PENDING`` status."""
-        async with self.session_factory() as session:
+        async with self._session() as session:
             session.add(
                 Result(
                     context_id=context_id,
                     quest_name=quest_name,
                     status="PENDING",
                     deps=json.dumps(deps),
+                    workflow_id=workflow_id,
                     result=None,
                     error=None,
                     timestamp=datetime.utcnow().isoformat(),
@@ -73,30 +340,65 @@ class ResultDB:
             )
             await session.commit()
 
-    async def mark_running(self, context_id: str) -> None:
-        """Mark the given task as currently running."""
-        async with self.session_factory() as session:
+    async def mark_running(self, context_id: str) -> bool:
+        async with self._session() as session:
+            res = await session.execute(
+                update(Result)
+                .where(
+                    Result.context_id == context_id,
+                    Result.status.not_in(SKIPPED_STATUSES),
+                )
+                .values(status="RUNNING")
+            )
+            await session.commit()
+            if cast(CursorResult[Any], res).rowcount > 0:
+                return True
+            result = await session.execute(
+                select(Result.status).where(Result.context_id == context_id)
+            )
+            row = result.first()
+            return row is None or row[0] not in SKIPPED_STATUSES
+
+    async def mark_running_many(self, context_ids: Sequence[str]) -> Set[str]:
+        async with self._session() as session:
             await session.execute(
                 update(Result)
-                .where(Result.context_id == context_id)
+                .where(
+                    Result.context_id.in_(context_ids),
+                    Result.status.not_in(SKIPPED_STATUSES),
+                )
                 .values(status="RUNNING")
             )
             await session.commit()
+            result = await session.execute(
+                select(Result.context_id).where(
+                    Result.context_id.in_(context_ids),
+                    Result.status.in_(SKIPPED_STATUSES),
+                )
+            )
+            return {row[0] for row in result.all()}
 
     async def fetch_status(self, context_id: str) -> Optional[str]:
-        """Return the status for the given task id."""
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Result.status).where(Result.context_id == context_id)
             )
             row = result.first()
             return row[0] if row is not None else None
 
+    async def fetch_statuses(self, context_ids: Sequence[str]) -> Dict[str, str]:
+        async with self._session() as session:
+            result = await session.execute(
+                select(Result.context_id, Result.status).where(
+                    Result.context_id.in_(context_ids)
+                )
+            )
+            return {context_id: status for context_id, status in result.all()}
+
     async def fetch_record(
         self, context_id: str
     ) -> Optional[tuple[str, str, Optional[str], List[str]]]:
-        """Fetch the task entry for the given id."""
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(
                     Result.quest_name,
@@ -111,45 +413,64 @@ class ResultDB:
             quest_name, status, error, deps = row
             return quest_name, status, error, json.loads(deps)
 
-    async def store(
+    async def fetch_records(
+        self, context_ids: Sequence[str]
+    ) -> Dict[str, tuple[str, str, Optional[str], List[str]]]:
+        async with self._session() as session:
+            result = await session.execute(
+                select(
+                    Result.context_id,
+                    Result.quest_name,
+                    Result.status,
+                    Result.error,
+                    Result.deps,
+                ).where(Result.context_id.in_(context_ids))
+            )
+            return {
+                context_id: (quest_name, status, error, json.loads(deps))
+                for context_id, quest_name, status, error, deps in result.all()
+            }
+
+    async def store_many(
         self,
-        context_id: str,
-        quest_name: str,
-        result: Optional[Any],
-        error: Optional[str],
-        status: str,
+        entries: Sequence[tuple[str, str, Optional[Any], Optional[str], str]],
     ) -> None:
-        async with self.session_factory() as session:
-            res = await session.execute(
-                update(Result)
-                .where(Result.context_id == context_id)
-                .values(
-                    result=None
-                    if result is None
-                    else TypeAdapter(Any).dump_json(result).decode(),
-                    error=error,
-                    status=status,
-                    timestamp=datetime.utcnow().isoformat(),
-                )
-            )
-            if res.rowcount == 0:
-                session.add(
-                    Result(
-                        context_id=context_id,
-                        quest_name=quest_name,
-                        status=status,
-                        deps=json.dumps([]),
-                        result=None
-                        if result is None
-                        else TypeAdapter(Any).dump_json(result).decode(),
+        async with self._session() as session:
+            for context_id, quest_name, result, error, status in entries:
+                res = await session.execute(
+                    update(Result)
+                    .where(
+                        Result.context_id == context_id,
+                        Result.status.not_in(SKIPPED_STATUSES),
+                    )
+                    .values(
+                        result=_dump_result(result),
                         error=error,
+                        status=status,
                         timestamp=datetime.utcnow().isoformat(),
                     )
                 )
+                if cast(CursorResult[Any], res).rowcount > 0:
+                    continue
+                existing = await session.execute(
+                    select(Result.id).where(Result.context_id == context_id)
+                )
+                if existing.first() is None:
+                    session.add(
+                        Result(
+                            context_id=context_id,
+                            quest_name=quest_name,
+                            status=status,
+                            deps=json.dumps([]),
+                            result=_dump_result(result),
+                            error=error,
+                            timestamp=datetime.utcnow().isoformat(),
+                        )
+                    )
             await session.commit()
 
     async def fetch_all(self) -> list[tuple]:
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(
                     Result.context_id,
@@ -176,7 +497,7 @@ class ResultDB:
         return parsed
 
     async def fetch_result(self, context_id: str) -> Optional[Any]:
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Result.result, Result.quest_name).where(
                     Result.context_id == context_id
@@ -194,20 +515,269 @@ class ResultDB:
                 result_type = fn.return_type
             return TypeAdapter(result_type).validate_json(value)
 
+    async def append_chunk(self, context_id: str, seq: int, value: Any) -> None:
+        async with self._session() as session:
+            session.add(
+                StreamChunk(
+                    context_id=context_id,
+                    seq=seq,
+                    value=TypeAdapter(Any).dump_json(value).decode(),
+                )
+            )
+            await session.commit()
+
+    async def fetch_chunks(self, context_id: str, start: int = 0) -> List[Any]:
+        async with self._session() as session:
+            result = await session.execute(
+                select(StreamChunk.value, Result.quest_name)
+                .join(Result, Result.context_id == StreamChunk.context_id)
+                .where(StreamChunk.context_id == context_id, StreamChunk.seq >= start)
+                .order_by(StreamChunk.seq)
+            )
+            rows = result.all()
+        chunks: List[Any] = []
+        for value, quest_name in rows:
+            fn = QUEST_REGISTRY.get(quest_name)
+            chunk_type = Any
+            if fn is not None:
+                chunk_type = fn.chunk_type
+            chunks.append(TypeAdapter(chunk_type).validate_json(value))
+        return chunks
+
     async def exists(self, context_id: str) -> bool:
-        """Return ``True`` if a result entry with the given context id exists."""
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(Result.id).where(
                     Result.context_id == context_id,
-                    Result.status.in_(["SUCCESS", "FAILED"]),
+                    Result.status.in_(FINISHED_STATUSES),
                 )
             )
             row = result.first()
             return row is not None
 
+    async def _fetch_workflow_ids(self, context_ids: Sequence[str]) -> Set[str]:
+        async with self._session() as session:
+            result = await session.execute(
+                select(Result.workflow_id).where(
+                    Result.context_id.in_(context_ids),
+                    Result.workflow_id.is_not(None),
+                )
+            )
+            return {
+                workflow_id
+                for workflow_id in result.scalars()
+                if workflow_id is not None
+            }
+
+    async def _fetch_workflow_graph(
+        self, workflow_ids: Iterable[str]
+    ) -> Dict[str, List[str]]:
+        async with self._session() as session:
+            result = await session.execute(
+                select(Result.context_id, Result.deps).where(
+                    Result.workflow_id.in_(list(workflow_ids))
+                )
+            )
+            return {task_id: json.loads(deps) for task_id, deps in result.all()}
+
+    async def _fetch_graph(self, context_ids: Sequence[str]) -> Dict[str, List[str]]:
+        return await self._fetch_workflow_graph(
+            await self._fetch_workflow_ids(context_ids)
+        )
+
+    async def _set_statuses(
+        self,
+        context_ids: Set[str],
+        status: str,
+        error: str,
+        current: Sequence[str] = ("PENDING",),
+    ) -> None:
+        if not context_ids:
+            return
+        async with self._session() as session:
+            await session.execute(
+                update(Result)
+                .where(
+                    Result.context_id.in_(context_ids),
+                    Result.status.in_(current),
+                )
+                .values(
+                    status=status,
+                    error=error,
+                    timestamp=datetime.utcnow().isoformat(),
+                )
+            )
+            await session.commit()
+
     async def teardown(self) -> None:
         """Drop all tables and dispose of the engine."""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.drop_all)
         await self.engine.dispose()
+
+
+def _closure(start: Iterable[str], edges: Dict[str, List[str]]) -> Set[str]:
+    """Return all ids reachable from ``start`` along ``edges``."""
+    reached: Set[str] = set()
+    stack = list(start)
+    while stack:
+        for task_id in edges.get(stack.pop(), []):
+            if task_id not in reached:
+                reached.add(task_id)
+                stack.append(task_id)
+    return reached
+
+
+class ShardedResultDB(BaseResultDB):
+    """Result database partitioned across several databases.
+
+    Each task is stored in the shard selected by a stable hash of its context
+    id. Single-task operations are routed to that shard while queries over all
+    tasks run against every shard concurrently. Using one SQLite file per shard
+    spreads write locks across the files.
+    """
+
+    def __init__(self, urls: Sequence[str]) -> None:
+        if not urls:
+            raise ValueError("ShardedResultDB requires at least one database URL")
+        self.shards = [ResultDB(url) for url in urls]
+
+    def _shard_index(self, context_id: str) -> int:
+        return zlib.crc32(context_id.encode()) % len(self.shards)
+
+    def shard(self, context_id: str) -> ResultDB:
+        """Return the shard responsible for ``context_id``."""
+        return self.shards[self._shard_index(context_id)]
+
+    async def setup(self) -> None:
+        await asyncio.gather(*(shard.setup() for shard in self.shards))
+
+    async def register_task(
+        self,
+        context_id: str,
+        quest_name: str,
+        deps: List[str],
+        workflow_id: Optional[str] = None,
+    ) -> None:
+        await self.shard(context_id).register_task(
+            context_id, quest_name, deps, workflow_id
+        )
+
+    def _group(self, context_ids: Iterable[str]) -> Dict[int, List[str]]:
+        groups: Dict[int, List[str]] = {}
+        for context_id in context_ids:
+            groups.setdefault(self._shard_index(context_id), []).append(context_id)
+        return groups
+
+    async def mark_running(self, context_id: str) -> bool:
+        return await self.shard(context_id).mark_running(context_id)
+
+    async def mark_running_many(self, context_ids: Sequence[str]) -> Set[str]:
+        skipped = await asyncio.gather(
+            *(
+                self.shards[i].mark_running_many(ids)
+                for i, ids in self._group(context_ids).items()
+            )
+        )
+        return set().union(*skipped)
+
+    async def fetch_status(self, context_id: str) -> Optional[str]:
+        return await self.shard(context_id).fetch_status(context_id)
+
+    async def fetch_statuses(self, context_ids: Sequence[str]) -> Dict[str, str]:
+        statuses: Dict[str, str] = {}
+        for part in await asyncio.gather(
+            *(
+                self.shards[i].fetch_statuses(ids)
+                for i, ids in self._group(context_ids).items()
+            )
+        ):
+            statuses.update(part)
+        return statuses
+
+    async def fetch_record(
+        self, context_id: str
+    ) -> Optional[tuple[str, str, Optional[str], List[str]]]:
+        return await self.shard(context_id).fetch_record(context_id)
+
+    async def fetch_records(
+        self, context_ids: Sequence[str]
+    ) -> Dict[str, tuple[str, str, Optional[str], List[str]]]:
+        records: Dict[str, tuple[str, str, Optional[str], List[str]]] = {}
+        for part in await asyncio.gather(
+            *(
+                self.shards[i].fetch_records(ids)
+                for i, ids in self._group(context_ids).items()
+            )
+        ):
+            records.update(part)
+        return records
+
+    async def store_many(
+        self,
+        entries: Sequence[tuple[str, str, Optional[Any], Optional[str], str]],
+    ) -> None:
+        groups: dict[
+            int, List[tuple[str, str, Optional[Any], Optional[str], str]]
+        ] = {}
+        for entry in entries:
+            groups.setdefault(self._shard_index(entry[0]), []).append(entry)
+        await asyncio.gather(
+            *(self.shards[i].store_many(group) for i, group in groups.items())
+        )
+
+    async def fetch_all(self) -> list[tuple]:
+        per_shard = await asyncio.gather(
+            *(shard.fetch_all() for shard in self.shards)
+        )
+        merged = [row for rows in per_shard for row in rows]
+        merged.sort(key=lambda row: row[4])
+        return merged
+
+    async def fetch_result(self, context_id: str) -> Optional[Any]:
+        return await self.shard(context_id).fetch_result(context_id)
+
+    async def append_chunk(self, context_id: str, seq: int, value: Any) -> None:
+        await self.shard(context_id).append_chunk(context_id, seq, value)
+
+    async def fetch_chunks(self, context_id: str, start: int = 0) -> List[Any]:
+        return await self.shard(context_id).fetch_chunks(context_id, start)
+
+    async def exists(self, context_id: str) -> bool:
+        return await self.shard(context_id).exists(context_id)
+
+    async def _fetch_graph(self, context_ids: Sequence[str]) -> Dict[str, List[str]]:
+        workflow_ids: Set[str] = set().union(
+            *await asyncio.gather(
+                *(
+                    self.shards[i]._fetch_workflow_ids(ids)
+                    for i, ids in self._group(context_ids).items()
+                )
+            )
+        )
+        if not workflow_ids:
+            return {}
+        graph: Dict[str, List[str]] = {}
+        # The tasks of a workflow are spread over all shards.
+        for part in await asyncio.gather(
+            *(shard._fetch_workflow_graph(workflow_ids) for shard in self.shards)
+        ):
+            graph.update(part)
+        return graph
+
+    async def _set_statuses(
+        self,
+        context_ids: Set[str],
+        status: str,
+        error: str,
+        current: Sequence[str] = ("PENDING",),
+    ) -> None:
+        await asyncio.gather(
+            *(
+                self.shards[i]._set_statuses(set(ids), status, error, current)
+                for i, ids in self._group(context_ids).items()
+            )
+        )
+
+    async def teardown(self) -> None:
+        await asyncio.gather(*(shard.teardown() for shard in self.shards))
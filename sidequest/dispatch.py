@@ -1,9 +1,9 @@
 """Utilities for dispatching quests to a message queue."""
 
-from typing import Any, List, Set
+from typing import Any, Dict, List, Set
 
-from .quests import QuestContext
-from .db import ResultDB
+from .quests import QUEST_REGISTRY, QuestContext
+from .db import BaseResultDB
 from .messages import QuestMessage
 
 
@@ -21,11 +21,15 @@ def _serialize(value: Any) -> Any:
 def _collect_messages(ctx: QuestContext, seen: Set[str]) -> List[QuestMessage]:
     messages: List[QuestMessage] = []
     deps: Set[str] = set()
+    streams: Set[str] = set()
 
     def handle(value: Any) -> None:
         if isinstance(value, QuestContext):
             messages.extend(_collect_messages(value, seen))
             deps.add(value.id)
+            fn = QUEST_REGISTRY.get(value.quest_name)
+            if fn is not None and fn.streaming:
+                streams.add(value.id)
         elif isinstance(value, (list, tuple)):
             for v in value:
                 handle(v)
@@ -46,6 +50,7 @@ def _collect_messages(ctx: QuestContext, seen: Set[str]) -> List[QuestMessage]:
                 args=_serialize(ctx.args),
                 kwargs=_serialize(ctx.kwargs),
                 deps=list(deps),
+                streams=list(streams),
             )
         )
         seen.add(ctx.id)
@@ -53,12 +58,67 @@ def _collect_messages(ctx: QuestContext, seen: Set[str]) -> List[QuestMessage]:
     return messages
 
 
-async def dispatch(quest: QuestContext, db: ResultDB | None = None) -> None:
-    """Asynchronously dispatch a quest and its dependencies."""
+def _fuse_messages(
+    messages: List[QuestMessage], persist_intermediates: bool
+) -> List[QuestMessage]:
+    """Merge linear chains of fusible quests into segment messages.
+
+    A fusible quest joins the segment of its dependency when that dependency is
+    its only one, is itself fusible and has no other consumer. ``messages`` must
+    be in dependency order, as returned by :func:`_collect_messages`.
+    """
+    consumers: Dict[str, int] = {}
+    for msg in messages:
+        for dep in msg.deps:
+            consumers[dep] = consumers.get(dep, 0) + 1
+
+    fused: List[QuestMessage] = []
+    # Maps the id of the last quest of each open segment to the segment head.
+    tails: Dict[str, QuestMessage] = {}
+    for msg in messages:
+        fn = QUEST_REGISTRY.get(msg.quest)
+        fusible = fn is not None and fn.fusible and not fn.streaming
+        if not fusible:
+            fused.append(msg)
+            continue
+        dep = msg.deps[0] if len(msg.deps) == 1 else None
+        if dep is not None and dep in tails and consumers[dep] == 1:
+            head = tails.pop(dep)
+            head.segment.append(msg)
+        else:
+            head = msg
+            head.persist_intermediates = persist_intermediates
+            fused.append(head)
+        tails[msg.id] = head
+    return fused
+
+
+async def dispatch(
+    quest: QuestContext,
+    db: BaseResultDB | None = None,
+    fuse: bool = False,
+    persist_intermediates: bool = True,
+    cancel_on_failure: bool = False,
+) -> None:
+    """Asynchronously dispatch a quest and its dependencies.
+
+    With ``fuse`` enabled, linear chains of fusible quests are sent as a single
+    message and executed back-to-back by one worker. Their intermediate results
+    are only persisted if ``persist_intermediates`` is set; otherwise
+    intermediate quests are recorded as successful without a result.
+
+    When a quest fails, its registered descendants are marked
+    ``UPSTREAM_FAILED`` and never executed. With ``cancel_on_failure``, pending
+    quests whose results are no longer needed are marked ``CANCELLED`` too.
+    """
     queue = quest.queue
     messages = _collect_messages(quest, set())
+    for msg in messages:
+        msg.cancel_on_failure = cancel_on_failure
     if db is not None:
         for msg in messages:
-            await db.register_task(msg.id, msg.quest, msg.deps)
+            await db.register_task(msg.id, msg.quest, msg.deps, quest.id)
+    if fuse:
+        messages = _fuse_messages(messages, persist_intermediates)
     for message in messages:
         await queue.send(message)
@@ -8,10 +8,22 @@ from pydantic import BaseModel
 
 
 class QuestMessage(BaseModel):
-    """Message dispatched to workers."""
+    """Message dispatched to workers.
+
+    A message with a non-empty ``segment`` is the head of a fused chain: the
+    quests in ``segment`` each consume the result of the previous one and are
+    executed right after it by the same worker.
+
+    With ``cancel_on_failure`` set, a failure of this quest also cancels the
+    unfinished quests that only contribute to the outcomes it failed.
+    """
 
     id: str
     quest: str
     args: Any
     kwargs: Any
     deps: List[str] = []
+    streams: List[str] = []
+    segment: List[QuestMessage] = []
+    persist_intermediates: bool = True
+    cancel_on_failure: bool = False
@@ -1,18 +1,25 @@
 """Quest decorator and registry."""
 
 from dataclasses import dataclass, field
-from inspect import Signature
+from inspect import Signature, isasyncgenfunction
 from typing import (
     Any,
+    AsyncIterator,
     Callable,
     Dict,
+    List,
+    Optional,
+    Sequence,
     Tuple,
     TypeVar,
     ParamSpec,
     Generic,
+    Protocol,
     cast,
+    overload,
     TypeAlias,
     Awaitable,
+    get_args,
 )
 from uuid import uuid4
 
@@ -21,13 +28,29 @@ from .queue import InMemoryQueue
 
 T_param = TypeVar("T_param")
 T_result = TypeVar("T_result")
+T_chunk = TypeVar("T_chunk")
 
 P_params = ParamSpec("P_params")
 QuestImplementation: TypeAlias = Callable[P_params, Awaitable[T_result]]
+StreamingQuestImplementation: TypeAlias = Callable[P_params, AsyncIterator[T_chunk]]
 
 QUEST_REGISTRY: Dict[str, "QuestWrapper"] = {}
 
 
+@dataclass
+class QuestArguments:
+    """Arguments of a single quest invocation within a batch."""
+
+    args: Tuple[Any, ...] = field(default_factory=tuple)
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+
+
+# Calls that failed may be answered with the exception instead of a result.
+BatchImplementation: TypeAlias = Callable[
+    [List[QuestArguments]], Awaitable[Sequence[T_result | Exception]]
+]
+
+
 @dataclass
 class QuestContext(Generic[T_result]):
     """Container for quest execution details."""
@@ -50,36 +73,124 @@ class QuestWrapper(Generic[P_params, T_result]):
     registered as quests
     """
 
-    _func: QuestImplementation[P_params, T_result]
+    # Streaming quests return their result, the stream, without being awaited.
+    _func: QuestImplementation[P_params, T_result] | Callable[P_params, T_result]
     _queue: InMemoryQueue
     _signature: Signature
+    fusible: bool = False
+    batch_size: Optional[int] = None
+    max_wait_ms: float = 0
+    _batch_func: Optional[BatchImplementation[T_result]] = None
 
     def __call__(self, *args: P_params.args, **kwargs: P_params.kwargs) -> QuestContext[T_result]:
         """Invoke the quest with the given arguments."""
         return QuestContext(self._func.__name__, self._queue, args, kwargs)
 
     async def accept(self, *args: P_params.args, **kwargs: P_params.kwargs) -> T_result:
-        """Accept and execute the quest with the given arguments."""
-        return await self._func(*args, **kwargs)
+        """Accept and execute the quest with the given arguments.
+
+        For streaming quests the returned value is the async iterator of chunks.
+        """
+        result = self._func(*args, **kwargs)
+        if self.streaming:
+            return cast(T_result, result)
+        return await cast(Awaitable[T_result], result)
+
+    def batch(
+        self, func: BatchImplementation[T_result]
+    ) -> BatchImplementation[T_result]:
+        """Register a vectorized implementation used to execute batches.
+
+        The function receives the arguments of every quest in the batch and
+        must return their results in the same order. An exception in place of
+        a result fails only that quest.
+        """
+        self._batch_func = func
+        return func
+
+    async def accept_batch(
+        self, calls: List[QuestArguments]
+    ) -> Sequence[T_result | Exception]:
+        """Execute ``calls`` with the registered batch implementation."""
+        if self._batch_func is None:
+            raise RuntimeError(
+                f"Quest {self._func.__name__} has no batch implementation"
+            )
+        results = await self._batch_func(calls)
+        if len(results) != len(calls):
+            raise ValueError(
+                f"Batch implementation returned {len(results)} results "
+                f"for {len(calls)} calls"
+            )
+        return results
+
+    @property
+    def vectorized(self) -> bool:
+        """Return ``True`` if a batch implementation is registered."""
+        return self._batch_func is not None
+
+    @property
+    def streaming(self) -> bool:
+        """Return ``True`` if the quest is an async generator."""
+        return isasyncgenfunction(self._func)
 
     @property
     def return_type(self) -> type:
         """Return the return type of the quest."""
         return self._signature.return_annotation
 
+    @property
+    def chunk_type(self) -> Any:
+        """Return the type of the chunks yielded by a streaming quest."""
+        type_args = get_args(self.return_type)
+        return type_args[0] if type_args else Any
+
+
+class QuestDecorator(Protocol):
+    """Decorator returned by :func:`quest`."""
+
+    @overload
+    def __call__(
+        self, func: StreamingQuestImplementation[P_params, T_chunk]
+    ) -> QuestWrapper[P_params, AsyncIterator[T_chunk]]: ...
+
+    @overload
+    def __call__(
+        self, func: QuestImplementation[P_params, T_result]
+    ) -> QuestWrapper[P_params, T_result]: ...
+
 
 def quest(
     *,
     queue: InMemoryQueue,
-) -> Callable[
-    [QuestImplementation[P_params, T_result]], QuestWrapper[P_params, T_result]
-]:
-    """Decorator to register a function as a quest."""
-
-    def decorator(
-        func: QuestImplementation[P_params, T_result],
-    ) -> QuestWrapper[P_params, T_result]:
-        quest_wrapper = QuestWrapper(func, queue, Signature.from_callable(func))
+    fusible: bool = False,
+    batch_size: Optional[int] = None,
+    max_wait_ms: float = 0,
+) -> QuestDecorator:
+    """Decorator to register a function as a quest.
+
+    Quests are async functions or, for streaming quests, async generators.
+
+    ``fusible`` quests may be executed back-to-back with their single upstream
+    quest when a workflow is dispatched with ``fuse=True``.
+
+    With ``batch_size`` set, workers gather up to that many ready invocations of
+    the quest, waiting at most ``max_wait_ms`` for more to arrive, and execute
+    them together. Register a vectorized implementation with
+    :meth:`QuestWrapper.batch`.
+    """
+    if batch_size is not None and batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    def decorator(func: Callable[..., Any]) -> QuestWrapper[Any, Any]:
+        quest_wrapper = QuestWrapper(
+            func,
+            queue,
+            Signature.from_callable(func),
+            fusible,
+            batch_size,
+            max_wait_ms,
+        )
         QUEST_REGISTRY[func.__name__] = quest_wrapper
         return quest_wrapper
 
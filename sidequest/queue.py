@@ -1,21 +1,61 @@
 """Simple message queue abstraction."""
 
-from typing import Any
+from typing import Any, Callable, List
+from collections import deque
 
 import asyncio
 
 
 class InMemoryQueue:
-    """Asynchronous in-memory queue using :class:`asyncio.Queue`."""
+    """Asynchronous in-memory FIFO queue."""
 
     def __init__(self) -> None:
-        self._queue: asyncio.Queue[Any] = asyncio.Queue()
+        self._messages: deque[Any] = deque()
+        self._available = asyncio.Condition()
 
     async def send(self, message: Any) -> None:
-        await self._queue.put(message)
+        async with self._available:
+            self._messages.append(message)
+            self._available.notify_all()
 
     async def receive(self) -> Any:
-        return await self._queue.get()
+        async with self._available:
+            await self._available.wait_for(lambda: bool(self._messages))
+            return self._messages.popleft()
 
     def empty(self) -> bool:
-        return self._queue.empty()
+        return not self._messages
+
+    def take(
+        self, predicate: Callable[[Any], bool], limit: int, look_ahead: int
+    ) -> List[Any]:
+        """Remove up to ``limit`` queued messages matching ``predicate``.
+
+        Only the first ``look_ahead`` messages are inspected. Messages that do
+        not match stay queued in their original order.
+        """
+        taken: List[Any] = []
+        kept: List[Any] = []
+        while (
+            self._messages
+            and len(taken) < limit
+            and len(taken) + len(kept) < look_ahead
+        ):
+            message = self._messages.popleft()
+            (taken if predicate(message) else kept).append(message)
+        self._messages.extendleft(reversed(kept))
+        return taken
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for a message to be queued.
+
+        Returns ``False`` if the queue is still empty afterwards.
+        """
+        async with self._available:
+            try:
+                await asyncio.wait_for(
+                    self._available.wait_for(lambda: bool(self._messages)), timeout
+                )
+            except TimeoutError:
+                return False
+        return True
@@ -2,21 +2,22 @@
 
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Collection, Mapping, Optional, Sequence
 from abc import ABC, abstractmethod
 import asyncio
 import traceback
 
 from .queue import InMemoryQueue
-from .quests import QUEST_REGISTRY, QuestWrapper
-from .db import ResultDB
+from .quests import QUEST_REGISTRY, QuestArguments, QuestWrapper
+from .db import SKIPPED_STATUSES, BaseResultDB, serialize_result
+from .cache import DEFAULT_CACHE, ResultCache
 from .messages import QuestMessage
 
 
 class BaseWorker(ABC):
     """Base class for workers that consume quests from a queue."""
 
-    def __init__(self, queue: InMemoryQueue, db: ResultDB) -> None:
+    def __init__(self, queue: InMemoryQueue, db: BaseResultDB) -> None:
         self.queue = queue
         self.db = db
         self._stop = False
@@ -27,6 +28,9 @@ class BaseWorker(ABC):
 
     async def run_once(self) -> None:
         """Process a single quest if available."""
+        await self._process_next()
+
+    async def _process_next(self) -> None:
         if self.queue.empty():
             return
         message: QuestMessage = await self.queue.receive()
@@ -35,7 +39,7 @@ class BaseWorker(ABC):
     async def run_forever(self) -> None:
         """Continuously process quests until :meth:`stop` is called."""
         while not self._stop:
-            await self.run_once()
+            await self._process_next()
             if self.queue.empty():
                 await self.on_idle()
 
@@ -54,8 +58,54 @@ class Worker(BaseWorker):
     Multiple workers can operate on the same queue concurrently. A worker will
     postpone execution of a quest until all of its dependencies have been
     processed.
+
+    Successful results are kept in a bounded :class:`ResultCache` so that
+    dependents picked up in the same process consume the live object, while the
+    result is persisted to the database in the background. Results are
+    serialized before they are handed off, so a result that cannot be persisted
+    fails its quest.
+
+    Dependents may consume a cached result before its write has completed. If
+    that write fails, the quest is recorded ``FAILED`` and all of its registered
+    descendants are marked ``UPSTREAM_FAILED``, including those that already
+    ran. Their own results are not written afterwards.
+
+    Unless given a cache, all workers of a process share one. Since those
+    workers also share the in-memory queue, whichever of them picks up a
+    dependent finds its inputs in the cache, so no scheduling preference is
+    needed. A dedicated cache limits the handoff to the workers using it.
     """
 
+    # Number of queued messages inspected when gathering a batch.
+    batch_look_ahead = 16
+
+    def __init__(
+        self,
+        queue: InMemoryQueue,
+        db: BaseResultDB,
+        cache: ResultCache | None = None,
+    ) -> None:
+        super().__init__(queue, db)
+        self.cache = cache if cache is not None else DEFAULT_CACHE
+        self._pending_writes: set[asyncio.Task[None]] = set()
+
+    async def run_once(self) -> None:
+        """Process a single quest if available and wait until its results are
+        stored."""
+        await super().run_once()
+        await self.flush()
+
+    async def run_forever(self) -> None:
+        try:
+            await super().run_forever()
+        finally:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Wait until all background result writes have completed."""
+        while self._pending_writes:
+            await asyncio.gather(*self._pending_writes)
+
     async def execute_quest(
         self,
         quest: QuestWrapper[Any, Any],
@@ -66,46 +116,348 @@ class Worker(BaseWorker):
 
         return await quest.accept(*args, **kwargs)
 
+    async def execute_batch(
+        self,
+        quest: QuestWrapper[Any, Any],
+        calls: list[QuestArguments],
+    ) -> Sequence[Any]:
+        """Execute the quest for a batch of calls. Subclasses may override.
+
+        Without a batch implementation, each call is executed concurrently with
+        :meth:`execute_quest`. Calls that raised are answered with their
+        exception.
+        """
+
+        if quest.vectorized:
+            return await quest.accept_batch(calls)
+        results = await asyncio.gather(
+            *(self.execute_quest(quest, call.args, call.kwargs) for call in calls),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(
+                result, Exception
+            ):
+                raise result
+        return results
+
+    async def dependency_state(self, message: QuestMessage) -> str:
+        """Return the state of the dependencies of ``message``.
+
+        ``"UPSTREAM_FAILED"`` if any of them failed or was skipped, ``"READY"``
+        if all of them succeeded and ``"WAITING"`` otherwise. Streaming
+        dependencies are ready as soon as they start producing chunks.
+        """
+        pending = [dep for dep in message.deps if dep not in self.cache]
+        if not pending:
+            return "READY"
+        statuses = await self.db.fetch_statuses(pending)
+        state = "READY"
+        for dep in pending:
+            status = statuses.get(dep)
+            if status in ("FAILED", *SKIPPED_STATUSES):
+                return "UPSTREAM_FAILED"
+            if status == "SUCCESS":
+                continue
+            if status == "STREAMING" and dep in message.streams:
+                continue
+            state = "WAITING"
+        return state
+
+    async def resolve(
+        self,
+        value: Any,
+        streams: Collection[str] = (),
+        results: Mapping[str, Any] | None = None,
+    ) -> Any:
+        """Replace result references in ``value`` with the referenced results.
+
+        References to streaming quests in ``streams`` resolve to an async
+        iterator over their chunks. ``results`` holds in-memory results that
+        take precedence over the cache and the database.
+        """
+        if isinstance(value, dict) and "__ref__" in value:
+            ref: str = value["__ref__"]
+            if ref in streams:
+                return self.db.stream(ref)
+            if results is not None and ref in results:
+                return results[ref]
+            if ref in self.cache:
+                return self.cache[ref]
+            return await self.db.fetch_result(ref)
+        if isinstance(value, list):
+            return [await self.resolve(v, streams, results) for v in value]
+        if isinstance(value, tuple):
+            return tuple([await self.resolve(v, streams, results) for v in value])
+        if isinstance(value, dict):
+            return {
+                k: await self.resolve(v, streams, results) for k, v in value.items()
+            }
+        return value
+
+    async def stream_quest(
+        self,
+        context_id: str,
+        quest_name: str,
+        quest: QuestWrapper[Any, Any],
+        args: Any,
+        kwargs: Any,
+    ) -> None:
+        """Execute a streaming quest, persisting each chunk as it is yielded."""
+        await self.db.store(context_id, quest_name, None, None, "STREAMING")
+        stream = await self.execute_quest(quest, args, kwargs)
+        seq = 0
+        async for chunk in stream:
+            await self.db.append_chunk(context_id, seq, chunk)
+            seq += 1
+        await self.db.store(context_id, quest_name, None, None, "SUCCESS")
+
+    async def run_segment(self, message: QuestMessage) -> None:
+        """Execute a fused chain of quests back-to-back in memory.
+
+        Results are handed from one quest to the next in memory and all quests
+        of the segment are persisted in one bulk write. Each quest is marked
+        running when it starts; the first one already is.
+        """
+        steps = [message, *message.segment]
+        tail = steps[-1]
+        results: dict[str, Any] = {}
+        entries: list[tuple[str, str, Optional[Any], Optional[str], str]] = []
+        failed: list[QuestMessage] = []
+        for step in steps:
+            if failed:
+                error = "Upstream quest failed"
+                entries.append((step.id, step.quest, None, error, "UPSTREAM_FAILED"))
+                continue
+            fn = QUEST_REGISTRY.get(step.quest)
+            if not fn:
+                error = f"Unknown quest: {step.quest}"
+                entries.append((step.id, step.quest, None, error, "FAILED"))
+                failed.append(step)
+                continue
+            if step is not message and not await self.db.mark_running(step.id):
+                break
+            try:
+                args = await self.resolve(step.args, message.streams, results)
+                kwargs = await self.resolve(step.kwargs, message.streams, results)
+                result = await self.execute_quest(fn, args, kwargs)
+                serialized = serialize_result(result)
+            except Exception:  # pylint: disable=broad-except
+                tb = traceback.format_exc()
+                entries.append((step.id, step.quest, None, tb, "FAILED"))
+                failed.append(step)
+                continue
+            results[step.id] = result
+            self.cache.put(step.id, result)
+            if step is not tail and not message.persist_intermediates:
+                serialized = None
+            entries.append((step.id, step.quest, serialized, None, "SUCCESS"))
+        self._persist(entries, failed)
+
+    async def gather_batch(
+        self, message: QuestMessage, batch_size: int, max_wait_ms: float
+    ) -> list[QuestMessage]:
+        """Collect up to ``batch_size`` messages for the quest of ``message``.
+
+        Matching messages are taken from the first :attr:`batch_look_ahead`
+        queued messages; the others stay on the queue for any worker to pick
+        up. Waits at most ``max_wait_ms`` for further messages while the queue
+        is empty.
+        """
+
+        def matches(other: QuestMessage) -> bool:
+            return other.quest == message.quest and not other.segment
+
+        batch = [message]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait_ms / 1000
+        while len(batch) < batch_size:
+            batch.extend(
+                self.queue.take(
+                    matches, batch_size - len(batch), self.batch_look_ahead
+                )
+            )
+            if len(batch) >= batch_size or not self.queue.empty():
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await self.queue.wait(remaining):
+                break
+        return batch
+
+    async def run_batch(
+        self, message: QuestMessage, quest: QuestWrapper[Any, Any]
+    ) -> None:
+        """Execute ready messages for a batched quest with a single call.
+
+        Messages whose dependencies are not ready are put back on the queue.
+        All results are persisted with one bulk write.
+        """
+        batch = await self.gather_batch(
+            message, quest.batch_size or 1, quest.max_wait_ms
+        )
+        entries: list[tuple[str, str, Optional[Any], Optional[str], str]] = []
+        failed: list[QuestMessage] = []
+        runnable: list[QuestMessage] = []
+        for msg in batch:
+            state = await self.dependency_state(msg)
+            if state == "WAITING":
+                await self.queue.send(msg)
+                continue
+            if state == "UPSTREAM_FAILED":
+                error = "Upstream quest failed"
+                entries.append((msg.id, msg.quest, None, error, "UPSTREAM_FAILED"))
+                continue
+            runnable.append(msg)
+        skipped = await self.db.mark_running_many([msg.id for msg in runnable])
+        ready: list[QuestMessage] = []
+        calls: list[QuestArguments] = []
+        for msg in runnable:
+            if msg.id in skipped:
+                continue
+            try:
+                args = await self.resolve(msg.args, msg.streams)
+                kwargs = await self.resolve(msg.kwargs, msg.streams)
+            except Exception:  # pylint: disable=broad-except
+                tb = traceback.format_exc()
+                entries.append((msg.id, msg.quest, None, tb, "FAILED"))
+                failed.append(msg)
+                continue
+            ready.append(msg)
+            calls.append(QuestArguments(tuple(args), kwargs))
+        if calls:
+            try:
+                results = await self.execute_batch(quest, calls)
+            except Exception:  # pylint: disable=broad-except
+                tb = traceback.format_exc()
+                entries.extend(
+                    (msg.id, msg.quest, None, tb, "FAILED") for msg in ready
+                )
+                failed.extend(ready)
+            else:
+                for msg, result in zip(ready, results):
+                    if isinstance(result, Exception):
+                        tb = "".join(traceback.format_exception(result))
+                        entries.append((msg.id, msg.quest, None, tb, "FAILED"))
+                        failed.append(msg)
+                        continue
+                    try:
+                        serialized = serialize_result(result)
+                    except Exception:  # pylint: disable=broad-except
+                        tb = traceback.format_exc()
+                        entries.append((msg.id, msg.quest, None, tb, "FAILED"))
+                        failed.append(msg)
+                        continue
+                    self.cache.put(msg.id, result)
+                    entries.append((msg.id, msg.quest, serialized, None, "SUCCESS"))
+        if entries:
+            self._persist(entries, failed)
+        else:
+            await asyncio.sleep(0)
+
+    def store_success(self, context_id: str, quest_name: str, result: Any) -> None:
+        """Hand off ``result`` in memory and persist it in the background.
+
+        Raises if ``result`` cannot be serialized, before it is handed off.
+        """
+        serialized = serialize_result(result)
+        self.cache.put(context_id, result)
+        self._persist([(context_id, quest_name, serialized, None, "SUCCESS")], [])
+
+    async def fail(self, message: QuestMessage, error: str) -> None:
+        """Record ``message`` as failed and propagate the failure downstream."""
+        await self.db.store(message.id, message.quest, None, error, "FAILED")
+        await self.db.mark_upstream_failed([message.id], message.cancel_on_failure)
+
+    async def skip(self, message: QuestMessage) -> None:
+        """Record ``message`` and its segment as ``UPSTREAM_FAILED``."""
+        error = "Upstream quest failed"
+        await self.db.store_many(
+            [
+                (step.id, step.quest, None, error, "UPSTREAM_FAILED")
+                for step in [message, *message.segment]
+            ]
+        )
+
+    async def _store_results(
+        self,
+        entries: list[tuple[str, str, Optional[Any], Optional[str], str]],
+        failed: list[QuestMessage],
+    ) -> None:
+        try:
+            await self.db.store_many(entries)
+        except Exception:  # pylint: disable=broad-except
+            # Nothing was written: withdraw the handed-off results and record
+            # every quest of the write as failed instead.
+            tb = traceback.format_exc()
+            for context_id, *_ in entries:
+                self.cache.discard(context_id)
+            await self.db.store_many(
+                [
+                    (context_id, quest_name, None, tb, "FAILED")
+                    for context_id, quest_name, *_ in entries
+                ]
+            )
+            # Dependents may already have consumed the results from the cache.
+            await self.db.mark_upstream_failed(
+                [context_id for context_id, *_ in entries], overwrite=True
+            )
+            return
+        # One closure per cancellation mode rather than one per failure.
+        for cancel_siblings in (False, True):
+            await self.db.mark_upstream_failed(
+                [m.id for m in failed if m.cancel_on_failure is cancel_siblings],
+                cancel_siblings,
+            )
+
+    def _persist(
+        self,
+        entries: list[tuple[str, str, Optional[Any], Optional[str], str]],
+        failed: list[QuestMessage],
+    ) -> None:
+        """Store ``entries`` in the background, then propagate ``failed``."""
+        task = asyncio.create_task(self._store_results(entries, failed))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
     async def handle_message(self, message: QuestMessage) -> None:
+        """Handle a single quest message.
+
+        Results may still be written in the background when this returns; use
+        :meth:`flush` to wait for them.
+        """
         quest_name: str = message.quest
         context_id: str = message.id
-        deps = message.deps
         args = message.args
         kwargs = message.kwargs
         fn = QUEST_REGISTRY.get(quest_name)
         if not fn:
-            await self.db.store(
-                context_id,
-                quest_name,
-                None,
-                f"Unknown quest: {quest_name}",
-                "FAILED",
-            )
+            await self.fail(message, f"Unknown quest: {quest_name}")
+            return
+        if fn.batch_size is not None and not fn.streaming and not message.segment:
+            await self.run_batch(message, fn)
             return
         try:
-            await self.db.mark_running(context_id)
-            for dep in deps:
-                if not await self.db.exists(dep):
-                    await self.queue.send(message)
-                    await asyncio.sleep(0)
-                    return
-
-            async def resolve(value: Any) -> Any:
-                if isinstance(value, dict) and "__ref__" in value:
-                    return await self.db.fetch_result(value["__ref__"])
-                if isinstance(value, list):
-                    return [await resolve(v) for v in value]
-                if isinstance(value, tuple):
-                    return tuple([await resolve(v) for v in value])
-                if isinstance(value, dict):
-                    return {k: await resolve(v) for k, v in value.items()}
-                return value
-
-            args = await resolve(args)
-            kwargs = await resolve(kwargs)
+            state = await self.dependency_state(message)
+            if state == "WAITING":
+                await self.queue.send(message)
+                await asyncio.sleep(0)
+                return
+            if state == "UPSTREAM_FAILED":
+                await self.skip(message)
+                return
+            if not await self.db.mark_running(context_id):
+                return
+
+            if message.segment:
+                await self.run_segment(message)
+                return
+            args = await self.resolve(args, message.streams)
+            kwargs = await self.resolve(kwargs, message.streams)
+            if fn.streaming:
+                await self.stream_quest(context_id, quest_name, fn, args, kwargs)
+                return
             result = await self.execute_quest(fn, args, kwargs)
-            await self.db.store(context_id, quest_name, result, None, "SUCCESS")
+            self.store_success(context_id, quest_name, result)
         except Exception:  # pylint: disable=broad-except
             tb = traceback.format_exc()
-            await self.db.store(context_id, quest_name, None, tb, "FAILED")
-
+            await self.fail(message, tb)
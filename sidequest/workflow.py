@@ -6,7 +6,7 @@ from typing import Any, Generic, List, Set, TypeVar
 
 from .quests import QuestContext
 from .dispatch import dispatch
-from .db import ResultDB
+from .db import FINISHED_STATUSES, BaseResultDB
 
 T_result = TypeVar("T_result")
 
@@ -44,29 +44,57 @@ class Workflow(Generic[T_result]):
         """Return all quest contexts in the workflow."""
         return _collect_contexts(self.root, set())
 
-    async def dispatch(self, db: ResultDB | None = None) -> None:
-        """Dispatch all quests in the workflow."""
-        await dispatch(self.root, db)
-
-    async def result(self, db: ResultDB) -> T_result | None:
+    async def dispatch(
+        self,
+        db: BaseResultDB | None = None,
+        fuse: bool = False,
+        persist_intermediates: bool = True,
+        cancel_on_failure: bool = False,
+    ) -> None:
+        """Dispatch all quests in the workflow.
+
+        See :func:`~sidequest.dispatch.dispatch` for the fusion and failure
+        options.
+        """
+        await dispatch(
+            self.root, db, fuse, persist_intermediates, cancel_on_failure
+        )
+
+    async def cancel(self, db: BaseResultDB) -> None:
+        """Cancel all quests of the workflow that have not started yet.
+
+        Quests that are already running are not interrupted.
+        """
+        await db.cancel([ctx.id for ctx in self.contexts()])
+
+    async def result(self, db: BaseResultDB) -> T_result | None:
         """Fetch the result of the root quest from the database."""
         return await db.fetch_result(self.root.id)
 
-    async def statuses(self, db: ResultDB) -> List[tuple[str, str, str]]:
+    async def statuses(self, db: BaseResultDB) -> List[tuple[str, str, str]]:
         """Return ``(id, quest_name, status)`` for all quests in the workflow."""
+        contexts = self.contexts()
+        records = await db.fetch_records([ctx.id for ctx in contexts])
+        dep_statuses = {ctx_id: record[1] for ctx_id, record in records.items()}
+        missing = {
+            dep
+            for _, status, _, deps in records.values()
+            if status == "PENDING"
+            for dep in deps
+            if dep not in dep_statuses
+        }
+        if missing:
+            dep_statuses.update(await db.fetch_statuses(list(missing)))
         states: List[tuple[str, str, str]] = []
-        for ctx in self.contexts():
-            record = await db.fetch_record(ctx.id)
+        for ctx in contexts:
+            record = records.get(ctx.id)
             if record is None:
                 continue
             quest_name, status, _err, deps = record
             if status == "PENDING":
-                waiting = False
-                for dep in deps:
-                    dep_status = await db.fetch_status(dep)
-                    if dep_status not in ("SUCCESS", "FAILED"):
-                        waiting = True
-                        break
+                waiting = any(
+                    dep_statuses.get(dep) not in FINISHED_STATUSES for dep in deps
+                )
                 status = "WAITING" if waiting else "PENDING"
             states.append((ctx.id, quest_name, status))
         return states
@@ -1,5 +1,8 @@
 import asyncio
+import tempfile
 import unittest
+from typing import Any, AsyncIterator, cast
+from unittest import mock
 
 import pydantic
 
@@ -9,6 +12,10 @@ from sidequest import (
     Worker,
     InMemoryQueue,
     ResultDB,
+    BaseResultDB,
+    ResultCache,
+    ShardedResultDB,
+    QuestArguments,
     QuestContext,
     Workflow,
 )
@@ -43,10 +50,87 @@ async def fail() -> int:
     raise RuntimeError("boom")
 
 
+@quest(queue=QUEUE)
+async def opaque() -> int:
+    return cast(int, object())
+
+
+@quest(queue=QUEUE, fusible=True)
+async def increment(a: int) -> int:
+    return a + 1
+
+
+BATCH_SIZES: list[int] = []
+
+
+@quest(queue=QUEUE, batch_size=2)
+async def square(a: int) -> int:
+    return a * a
+
+
+@square.batch
+async def square_batch(calls: list[QuestArguments]) -> list[int]:
+    BATCH_SIZES.append(len(calls))
+    return [call.args[0] * call.args[0] for call in calls]
+
+
+@quest(queue=QUEUE, batch_size=2, max_wait_ms=1000)
+async def cube(a: int) -> int:
+    return a * a * a
+
+
+@cube.batch
+async def cube_batch(calls: list[QuestArguments]) -> list[int]:
+    BATCH_SIZES.append(len(calls))
+    return [call.args[0] ** 3 for call in calls]
+
+
+@quest(queue=QUEUE, batch_size=4)
+async def halve(a: int) -> int:
+    if a % 2:
+        raise ValueError(f"{a} is odd")
+    return a // 2
+
+
+EVENTS: list[str] = []
+
+
+@quest(queue=QUEUE)
+async def record(a: int) -> int:
+    EVENTS.append(f"record {a}")
+    return a
+
+
+@quest(queue=QUEUE)
+async def nap(a: int) -> int:
+    await asyncio.sleep(0.05)
+    EVENTS.append(f"nap {a}")
+    return a
+
+
+@quest(queue=QUEUE)
+async def count(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        EVENTS.append(f"produce {i}")
+        yield i
+        await asyncio.sleep(0.02)
+
+
+@quest(queue=QUEUE)
+async def total(numbers: AsyncIterator[int]) -> int:
+    result = 0
+    async for number in numbers:
+        EVENTS.append(f"consume {number}")
+        result += number
+    return result
+
+
 class TestSideQuest(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self) -> None:
         while not QUEUE.empty():
             await QUEUE.receive()
+        EVENTS.clear()
+        BATCH_SIZES.clear()
         self.db = ResultDB()
         await self.db.setup()
 
@@ -143,7 +227,8 @@ class TestSideQuest(unittest.IsolatedAsyncioTestCase):
         w2 = Worker(QUEUE, self.db)
         t1 = asyncio.create_task(w1.run_forever())
         t2 = asyncio.create_task(w2.run_forever())
-        while not QUEUE.empty():
+        # A worker may hold the root while its dependencies are still running.
+        while not QUEUE.empty() or not await self.db.exists(ctx3.id):
             await asyncio.sleep(0)
         w1.stop()
         w2.stop()
@@ -172,7 +257,483 @@ class TestSideQuest(unittest.IsolatedAsyncioTestCase):
         states = {cid: status for cid, _, status in await wf.statuses(self.db)}
         self.assertEqual(states[c1.id], "SUCCESS")
         self.assertEqual(states[c2.id], "FAILED")
-        self.assertEqual(states[root.id], "FAILED")
+        self.assertEqual(states[root.id], "UPSTREAM_FAILED")
+
+    async def test_dependents_use_cached_results(self) -> None:
+        ctx1 = add(1, 2)
+        ctx2 = add(ctx1.cast, 10)
+        await dispatch(ctx2)
+        worker = Worker(QUEUE, self.db)
+        with mock.patch.object(
+            self.db, "fetch_result", wraps=self.db.fetch_result
+        ) as fetch_result:
+            task = asyncio.create_task(worker.run_forever())
+            while not QUEUE.empty():
+                await asyncio.sleep(0)
+            worker.stop()
+            await task
+        fetch_result.assert_not_called()
+        self.assertIn(ctx1.id, worker.cache)
+        self.assertEqual(await self.db.fetch_result(ctx1.id), 3)
+        self.assertEqual(await self.db.fetch_result(ctx2.id), 13)
+
+    async def test_run_once_waits_for_result_write(self) -> None:
+        ctx = add(1, 2)
+        await dispatch(ctx, self.db)
+        await Worker(QUEUE, self.db).run_once()
+        self.assertEqual(await self.db.fetch_status(ctx.id), "SUCCESS")
+        self.assertEqual(await self.db.fetch_result(ctx.id), 3)
+
+    async def test_unserializable_result_fails_quest(self) -> None:
+        producer = opaque()
+        root = add(producer.cast, 1)
+        wf = Workflow(root)
+        await wf.dispatch(self.db)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        states = {cid: status for cid, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states[producer.id], "FAILED")
+        self.assertEqual(states[root.id], "UPSTREAM_FAILED")
+        self.assertNotIn(producer.id, worker.cache)
+
+    async def test_failed_background_write_fails_quest(self) -> None:
+        ctx = add(1, 2)
+        await dispatch(ctx, self.db)
+        store_many = self.db.store_many
+        calls = 0
+
+        async def flaky_store_many(entries: Any) -> None:
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise RuntimeError("disk full")
+            await store_many(entries)
+
+        worker = Worker(QUEUE, self.db)
+        with mock.patch.object(self.db, "store_many", flaky_store_many):
+            task = asyncio.create_task(worker.run_forever())
+            while not QUEUE.empty():
+                await asyncio.sleep(0)
+            worker.stop()
+            await task
+        self.assertEqual(await self.db.fetch_status(ctx.id), "FAILED")
+        [(_, _, result, error, _)] = await self.db.fetch_all()
+        self.assertIsNone(result)
+        self.assertIn("disk full", error)
+        self.assertNotIn(ctx.id, worker.cache)
+
+    async def test_failed_background_write_fails_consumers(self) -> None:
+        producer = add(1, 2)
+        consumer = add(producer.cast, 1)
+        wf = Workflow(consumer)
+        await wf.dispatch(self.db)
+        store_many = self.db.store_many
+        consumed = asyncio.Event()
+
+        async def late_failing_store_many(entries: Any) -> None:
+            if entries[0][0] == producer.id and entries[0][4] == "SUCCESS":
+                await consumed.wait()
+                raise RuntimeError("disk full")
+            await store_many(entries)
+
+        worker = Worker(QUEUE, self.db)
+        with mock.patch.object(self.db, "store_many", late_failing_store_many):
+            await worker.handle_message(await QUEUE.receive())
+            await worker.handle_message(await QUEUE.receive())
+            while await self.db.fetch_status(consumer.id) != "SUCCESS":
+                await asyncio.sleep(0)
+            consumed.set()
+            await worker.flush()
+        states = {cid: status for cid, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states[producer.id], "FAILED")
+        self.assertEqual(states[consumer.id], "UPSTREAM_FAILED")
+
+    def test_workers_share_default_cache(self) -> None:
+        self.assertIs(Worker(QUEUE, self.db).cache, Worker(QUEUE, self.db).cache)
+        cache = ResultCache()
+        self.assertIs(Worker(QUEUE, self.db, cache).cache, cache)
+
+    def test_result_cache_evicts_least_recently_used(self) -> None:
+        cache = ResultCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache["a"], 1)
+        cache.put("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
+
+    async def test_streaming_quest_persists_chunks(self) -> None:
+        ctx = count(3)
+        await dispatch(ctx)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        self.assertEqual(await self.db.fetch_status(ctx.id), "SUCCESS")
+        self.assertEqual(await self.db.fetch_chunks(ctx.id), [0, 1, 2])
+        self.assertEqual(await self.db.fetch_chunks(ctx.id, 2), [2])
+
+    async def test_streaming_consumer_starts_before_producer_finishes(self) -> None:
+        producer = count(5)
+        consumer = total(producer.cast)
+        await dispatch(consumer)
+        w1 = Worker(QUEUE, self.db)
+        w2 = Worker(QUEUE, self.db)
+        t1 = asyncio.create_task(w1.run_forever())
+        t2 = asyncio.create_task(w2.run_forever())
+        while await self.db.fetch_status(consumer.id) != "SUCCESS":
+            await asyncio.sleep(0.01)
+        w1.stop()
+        w2.stop()
+        await asyncio.gather(t1, t2)
+        self.assertEqual(await self.db.fetch_result(consumer.id), 10)
+        self.assertLess(EVENTS.index("consume 0"), EVENTS.index("produce 4"))
+
+    async def test_sharded_result_db(self) -> None:
+        db = ShardedResultDB(["sqlite+aiosqlite:///:memory:"] * 3)
+        self.assertIsInstance(db, BaseResultDB)
+        self.assertNotIsInstance(db, ResultDB)
+        await db.setup()
+        try:
+            leaves = [add(i, i) for i in range(6)]
+            root = add(add(leaves[0].cast, leaves[1].cast).cast, 1)
+            wf = Workflow(root)
+            for leaf in leaves[2:]:
+                await dispatch(leaf, db)
+            await wf.dispatch(db)
+            worker = Worker(QUEUE, db)
+            task = asyncio.create_task(worker.run_forever())
+            while not QUEUE.empty():
+                await asyncio.sleep(0)
+            worker.stop()
+            await task
+            self.assertEqual(await wf.result(db), 3)
+            results = await db.fetch_all()
+            self.assertEqual(len(results), 8)
+            for shard in db.shards:
+                for context_id, *_ in await shard.fetch_all():
+                    self.assertIs(db.shard(context_id), shard)
+            states = {status for _, _, status in await wf.statuses(db)}
+            self.assertEqual(states, {"SUCCESS"})
+        finally:
+            await db.teardown()
+
+    async def test_fused_chain_dispatches_single_message(self) -> None:
+        first = increment(0)
+        second = increment(first.cast)
+        third = increment(second.cast)
+        other = add(1, 2)
+        root = add(third.cast, other.cast)
+        wf = Workflow(root)
+        await wf.dispatch(self.db, fuse=True)
+        messages = []
+        while not QUEUE.empty():
+            messages.append(await QUEUE.receive())
+        self.assertEqual(len(messages), 3)
+        head = next(m for m in messages if m.id == first.id)
+        self.assertEqual([m.id for m in head.segment], [second.id, third.id])
+        for message in messages:
+            await QUEUE.send(message)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        self.assertEqual(await wf.result(self.db), 6)
+        self.assertEqual(await self.db.fetch_result(second.id), 2)
+        states = {status for _, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states, {"SUCCESS"})
+
+    async def test_fused_chain_marks_steps_running_as_they_start(self) -> None:
+        first = increment(0)
+        second = increment(first.cast)
+        third = increment(second.cast)
+        wf = Workflow(third)
+        await wf.dispatch(self.db, fuse=True)
+        seen: list[list[str]] = []
+        db = self.db
+
+        class SnapshotWorker(Worker):
+            async def execute_quest(self, quest: Any, args: Any, kwargs: Any) -> Any:
+                seen.append([status for _, _, status in await wf.statuses(db)])
+                return await super().execute_quest(quest, args, kwargs)
+
+        await SnapshotWorker(QUEUE, self.db).run_once()
+        self.assertEqual(
+            seen,
+            [
+                ["RUNNING", "WAITING", "WAITING"],
+                ["RUNNING", "RUNNING", "WAITING"],
+                ["RUNNING", "RUNNING", "RUNNING"],
+            ],
+        )
+        self.assertEqual(await wf.result(self.db), 3)
+
+    async def test_fused_chain_persists_only_tail(self) -> None:
+        first = increment(0)
+        second = increment(first.cast)
+        wf = Workflow(increment(second.cast))
+        await wf.dispatch(self.db, fuse=True, persist_intermediates=False)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        self.assertEqual(await wf.result(self.db), 3)
+        self.assertIsNone(await self.db.fetch_result(first.id))
+        self.assertIsNone(await self.db.fetch_result(second.id))
+        states = {status for _, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states, {"SUCCESS"})
+
+    async def test_batched_quest_executes_in_batches(self) -> None:
+        squares = [square(i) for i in range(5)]
+        other = add(1, 2)
+        await dispatch(squares[0])
+        await dispatch(other)
+        for ctx in squares[1:]:
+            await dispatch(ctx)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        self.assertEqual(BATCH_SIZES, [2, 2, 1])
+        for i, ctx in enumerate(squares):
+            self.assertEqual(await self.db.fetch_result(ctx.id), i * i)
+        self.assertEqual(await self.db.fetch_result(other.id), 3)
+
+    async def test_batch_waits_for_late_messages(self) -> None:
+        first = cube(1)
+        second = cube(2)
+        await dispatch(first)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        await asyncio.sleep(0.05)
+        await dispatch(second)
+        while await self.db.fetch_status(second.id) != "SUCCESS":
+            await asyncio.sleep(0.01)
+        worker.stop()
+        await task
+        self.assertEqual(BATCH_SIZES, [2])
+        self.assertEqual(await self.db.fetch_result(second.id), 8)
+
+    async def test_batch_gathering_preserves_queue_order(self) -> None:
+        for ctx in [square(1), record(1), square(2), record(2), record(3)]:
+            await dispatch(ctx)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        self.assertEqual(BATCH_SIZES, [2])
+        self.assertEqual(EVENTS, ["record 1", "record 2", "record 3"])
+
+    async def test_batch_gathering_leaves_other_messages_queued(self) -> None:
+        contexts = [square(1), record(1), record(2), square(2), square(3)]
+        for ctx in contexts:
+            await dispatch(ctx)
+        worker = Worker(QUEUE, self.db)
+        worker.batch_look_ahead = 3
+        first = await QUEUE.receive()
+        batch = await worker.gather_batch(first, 3, 0)
+        self.assertEqual([msg.id for msg in batch], [contexts[0].id, contexts[3].id])
+        queued = [(await QUEUE.receive()).id for _ in range(3)]
+        self.assertEqual(queued, [ctx.id for ctx in contexts[1:3]] + [contexts[4].id])
+
+    async def test_batch_fallback_fails_only_raising_calls(self) -> None:
+        contexts = [halve(i) for i in (2, 3, 4, 6)]
+        for ctx in contexts:
+            await dispatch(ctx)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        statuses = [await self.db.fetch_status(ctx.id) for ctx in contexts]
+        self.assertEqual(statuses, ["SUCCESS", "FAILED", "SUCCESS", "SUCCESS"])
+        self.assertEqual(await self.db.fetch_result(contexts[3].id), 3)
+        errors = {row[0]: row[3] for row in await self.db.fetch_all()}
+        self.assertIn("3 is odd", errors[contexts[1].id])
+
+    async def test_batch_fallback_uses_execute_quest(self) -> None:
+        executed: list[Any] = []
+
+        class RecordingWorker(Worker):
+            async def execute_quest(self, quest: Any, args: Any, kwargs: Any) -> Any:
+                executed.append(args)
+                return await super().execute_quest(quest, args, kwargs)
+
+        for i in (2, 4, 6):
+            await dispatch(halve(i))
+        worker = RecordingWorker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        self.assertEqual(sorted(executed), [(2,), (4,), (6,)])
+
+    async def test_batched_quest_as_dependency(self) -> None:
+        root = add(square(3).cast, square(4).cast)
+        wf = Workflow(root)
+        await wf.dispatch(self.db)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        self.assertEqual(BATCH_SIZES, [2])
+        self.assertEqual(await wf.result(self.db), 25)
+        states = {status for _, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states, {"SUCCESS"})
+
+    async def test_failure_skips_descendants(self) -> None:
+        failed = fail()
+        child = record(failed.cast)
+        grandchild = add(child.cast, 1)
+        wf = Workflow(grandchild)
+        await wf.dispatch(self.db)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        states = {cid: status for cid, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states[failed.id], "FAILED")
+        self.assertEqual(states[child.id], "UPSTREAM_FAILED")
+        self.assertEqual(states[grandchild.id], "UPSTREAM_FAILED")
+        self.assertEqual(EVENTS, [])
+        self.assertEqual(
+            await self.db.fetch_record(grandchild.id),
+            (
+                "add",
+                "UPSTREAM_FAILED",
+                f"Upstream quest {failed.id} failed",
+                [child.id],
+            ),
+        )
+
+    async def test_batch_failures_propagate_within_workflow(self) -> None:
+        first, second = halve(3), halve(5)
+        root = add(first.cast, second.cast)
+        wf = Workflow(root)
+        await wf.dispatch(self.db)
+        other = Workflow(record(7))
+        await other.dispatch(self.db)
+        worker = Worker(QUEUE, self.db)
+        with mock.patch.object(
+            self.db, "_fetch_graph", wraps=self.db._fetch_graph
+        ) as fetch_graph:
+            task = asyncio.create_task(worker.run_forever())
+            while not QUEUE.empty():
+                await asyncio.sleep(0)
+            worker.stop()
+            await task
+        fetch_graph.assert_awaited_once_with([first.id, second.id])
+        graph = await self.db._fetch_graph([first.id])
+        self.assertEqual(set(graph), {first.id, second.id, root.id})
+        self.assertEqual(await self.db.fetch_status(root.id), "UPSTREAM_FAILED")
+        self.assertEqual(EVENTS, ["record 7"])
+
+    async def test_failure_cancels_siblings(self) -> None:
+        failed = fail()
+        sibling = record(1)
+        root = add(failed.cast, sibling.cast)
+        wf = Workflow(root)
+        await wf.dispatch(self.db, cancel_on_failure=True)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        states = {cid: status for cid, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states[failed.id], "FAILED")
+        self.assertEqual(states[sibling.id], "CANCELLED")
+        self.assertEqual(states[root.id], "UPSTREAM_FAILED")
+        self.assertEqual(EVENTS, [])
+
+    async def test_failure_leaves_running_siblings_alone(self) -> None:
+        sibling = nap(1)
+        failed = fail()
+        root = add(sibling.cast, failed.cast)
+        wf = Workflow(root)
+        await wf.dispatch(self.db, cancel_on_failure=True)
+        w1 = Worker(QUEUE, self.db)
+        t1 = asyncio.create_task(w1.run_forever())
+        while await self.db.fetch_status(sibling.id) != "RUNNING":
+            await asyncio.sleep(0)
+        w2 = Worker(QUEUE, self.db)
+        t2 = asyncio.create_task(w2.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        w1.stop()
+        w2.stop()
+        await asyncio.gather(t1, t2)
+        states = {cid: status for cid, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states[failed.id], "FAILED")
+        self.assertEqual(states[sibling.id], "SUCCESS")
+        self.assertEqual(states[root.id], "UPSTREAM_FAILED")
+        self.assertEqual(EVENTS, ["nap 1"])
+
+    async def test_cancel_workflow(self) -> None:
+        wf = Workflow(add(record(1).cast, record(2).cast))
+        await wf.dispatch(self.db)
+        await wf.cancel(self.db)
+        worker = Worker(QUEUE, self.db)
+        task = asyncio.create_task(worker.run_forever())
+        while not QUEUE.empty():
+            await asyncio.sleep(0)
+        worker.stop()
+        await task
+        states = {status for _, _, status in await wf.statuses(self.db)}
+        self.assertEqual(states, {"CANCELLED"})
+        self.assertEqual(EVENTS, [])
+
+    async def test_sharded_result_db_with_files(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            db = ShardedResultDB(
+                [f"sqlite+aiosqlite:///{directory}/shard-{i}.db" for i in range(4)]
+            )
+            await db.setup()
+            try:
+                leaves = [add(i, 1) for i in range(8)]
+                root = add(add(leaves[0].cast, leaves[1].cast).cast, 1)
+                wf = Workflow(root)
+                await wf.dispatch(db)
+                for leaf in leaves[2:]:
+                    await dispatch(leaf, db)
+                w1 = Worker(QUEUE, db)
+                w2 = Worker(QUEUE, db)
+                t1 = asyncio.create_task(w1.run_forever())
+                t2 = asyncio.create_task(w2.run_forever())
+                while await db.fetch_status(root.id) != "SUCCESS":
+                    await asyncio.sleep(0.01)
+                while not QUEUE.empty():
+                    await asyncio.sleep(0)
+                w1.stop()
+                w2.stop()
+                await asyncio.gather(t1, t2)
+                self.assertEqual(await wf.result(db), 4)
+                self.assertEqual(len(await db.fetch_all()), 10)
+                states = {status for _, _, status in await wf.statuses(db)}
+                self.assertEqual(states, {"SUCCESS"})
+            finally:
+                await db.teardown()
 
 
 if __name__ == "__main__":